@@ -0,0 +1,107 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter, deque
+
+PRIORITY_ACTIVE = 0   # session already mid-conversation
+PRIORITY_NEW = 1
+
+
+class LoadShed(Exception):
+    """Raised when a request is not admitted to the LLM fallback."""
+
+
+class _Waiter:
+    __slots__ = ("shed_reason",)
+
+    def __init__(self):
+        self.shed_reason = None
+
+
+class AdmissionController:
+    """
+    Global gate in front of the LLM endpoint.
+
+    At most `max_concurrent` calls run at once. Others wait in a priority
+    queue (lower number first, FIFO within a priority) of at most `max_queue`
+    entries for up to `max_wait_ms`. A full queue sheds the newcomer, or
+    evicts the newest lowest-priority waiter if the newcomer outranks it.
+    """
+
+    def __init__(self, max_concurrent=4, max_queue=16, max_wait_ms=3000):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait_ms = max_wait_ms
+        self._cond = threading.Condition()
+        self._queue = []                 # heap of (priority, seq, waiter)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._waits_ms = deque(maxlen=1000)
+        self.admitted = 0
+        self.shed = Counter()
+        self.max_depth = 0
+
+    def acquire(self, priority=PRIORITY_NEW, wait=True):
+        start = time.perf_counter()
+        with self._cond:
+            if self._in_flight < self.max_concurrent and not self._queue:
+                self._admit(start)
+                return True
+            if not wait:
+                return False   # opportunistic callers (speculation) just don't start
+            if len(self._queue) >= self.max_queue:
+                worst = max(self._queue, default=None)
+                if worst is None or worst[0] <= priority:
+                    self.shed["queue_full"] += 1
+                    return False
+                self._queue.remove(worst)
+                heapq.heapify(self._queue)
+                worst[2].shed_reason = "evicted"
+                self.shed["evicted"] += 1
+                self._cond.notify_all()
+
+            entry = (priority, next(self._seq), _Waiter())
+            heapq.heappush(self._queue, entry)
+            self.max_depth = max(self.max_depth, len(self._queue))
+            deadline = start + self.max_wait_ms / 1000
+            while True:
+                if entry[2].shed_reason:
+                    return False
+                if self._queue[0] is entry and self._in_flight < self.max_concurrent:
+                    heapq.heappop(self._queue)
+                    self._admit(start)
+                    self._cond.notify_all()   # the next waiter may fit too
+                    return True
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._queue.remove(entry)
+                    heapq.heapify(self._queue)
+                    self.shed["timeout"] += 1
+                    self._cond.notify_all()
+                    return False
+                self._cond.wait(remaining)
+
+    def release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _admit(self, start):
+        self._in_flight += 1
+        self.admitted += 1
+        self._waits_ms.append((time.perf_counter() - start) * 1000)
+
+    def stats(self):
+        with self._cond:
+            waits = sorted(self._waits_ms)
+            return {
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self.max_depth,
+                "admitted": self.admitted,
+                "shed": sum(self.shed.values()),
+                "shed_by_reason": dict(self.shed),
+                "avg_wait_ms": round(sum(waits) / len(waits), 1) if waits else 0.0,
+                "p95_wait_ms": round(waits[int(len(waits) * 0.95) - 1], 1) if waits else 0.0,
+            }
@@ -0,0 +1,140 @@
+import re
+import numpy as np
+
+# ------------------ UNITS ------------------
+# unit word -> (dimension, amount in that dimension's base unit).
+# Only units of the same dimension convert: a pack, a bunch and a piece are not interchangeable.
+UNITS = {
+    "kg": ("weight", 1.0), "kgs": ("weight", 1.0), "kilo": ("weight", 1.0), "kilos": ("weight", 1.0),
+    "kilogram": ("weight", 1.0), "kilograms": ("weight", 1.0),
+    "g": ("weight", 0.001), "gm": ("weight", 0.001), "gms": ("weight", 0.001),
+    "gram": ("weight", 0.001), "grams": ("weight", 0.001),
+    "l": ("volume", 1.0), "ltr": ("volume", 1.0), "ltrs": ("volume", 1.0),
+    "litre": ("volume", 1.0), "litres": ("volume", 1.0), "liter": ("volume", 1.0), "liters": ("volume", 1.0),
+    "ml": ("volume", 0.001), "mls": ("volume", 0.001),
+    "dozen": ("pieces", 12.0), "dozens": ("pieces", 12.0),
+    "piece": ("pieces", 1.0), "pieces": ("pieces", 1.0), "pcs": ("pieces", 1.0), "pc": ("pieces", 1.0),
+    "unit": ("pieces", 1.0), "units": ("pieces", 1.0),
+    "packet": ("packs", 1.0), "packets": ("packs", 1.0), "pkt": ("packs", 1.0), "pkts": ("packs", 1.0),
+    "pack": ("packs", 1.0), "packs": ("packs", 1.0),
+    "bunch": ("bunches", 1.0), "bunches": ("bunches", 1.0),
+}
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12, "half": 0.5,
+}
+
+SEPARATOR_RE = re.compile(r"\s*(?:,|&|;|\+|\n|\band\b)\s*")
+
+
+class CartCatalog:
+    """
+    Catalog compiled for cart parsing: one regex that finds every
+    "<qty> <unit> <item>" or "<item> <qty> <unit>" in a message, plus a
+    NumPy price array so a whole cart is priced in one vectorized step.
+    """
+
+    def __init__(self, items, normalize=None, price_units=None):
+        # price_units: zepto_data.json "price_units" — what one catalog price buys,
+        # {"categories": {category: unit}, "items": {item: unit}}; anything unlisted is per unit
+        price_units = price_units or {}
+        category_units = price_units.get("categories", {})
+        item_units = price_units.get("items", {})
+        self.names, self.categories, prices, self.price_units = [], [], [], []
+        aliases = {}
+        for category, entries in items.items():
+            for name, price in entries.items():
+                item_id = len(self.names)
+                self.names.append(name)
+                self.categories.append(category)
+                prices.append(price)
+                self.price_units.append(item_units.get(name, category_units.get(category, "unit")))
+                aliases[name] = item_id
+                if normalize:
+                    aliases.setdefault(normalize(name), item_id)
+        self.prices = np.asarray(prices, dtype=np.float64)
+        self._aliases = aliases
+
+        # Longest names first so "chilli powder" wins over any shorter overlap
+        item_alt = "|".join(re.escape(a).replace(r"\ ", r"\s+") for a in sorted(aliases, key=len, reverse=True))
+        unit_alt = "|".join(sorted(UNITS, key=len, reverse=True))
+        qty = r"(?:\d+(?:\.\d+)?|" + "|".join(NUMBER_WORDS) + r")"
+        self._line_re = re.compile(
+            rf"(?<![a-z0-9.])(?:(?P<qty>{qty})\s*(?:(?P<unit>{unit_alt})(?![a-z])\s*)?(?:of\s+)?)?"
+            rf"(?<![a-z])(?P<item>{item_alt})(?:es|s)?(?![a-z])"
+            rf"(?:\s*[-:x×@]?\s*(?P<qty2>\d+(?:\.\d+)?)\s*(?P<unit2>{unit_alt})?(?![a-z])(?=\s*(?:$|[,&;+\n]|and\b)))?"
+        )
+
+    # ---- Parsing ----
+    def parse(self, text):
+        """Returns (cart lines, fragments with no exact item) for a lowercased message."""
+        lines, spans = [], []
+        for m in self._line_re.finditer(text):
+            qty, unit = (m.group("qty"), m.group("unit")) if m.group("qty") else (m.group("qty2"), m.group("unit2"))
+            # "a mango" asks about mango; "a dozen eggs" / "a kg onion" is a quantity
+            if qty in ("a", "an") and not unit:
+                qty = None
+            quantity = None if qty is None else float(NUMBER_WORDS.get(qty, qty))
+            item_id = self._aliases[re.sub(r"\s+", " ", m.group("item"))]
+            lines.append(self.line(item_id, quantity, unit))
+            spans.append(m.span())
+
+        leftovers, pos = [], 0
+        for fragment in SEPARATOR_RE.split(text):
+            start = text.find(fragment, pos)
+            end = start + len(fragment)
+            pos = end
+            if fragment.strip() and not any(s < end and start < e for s, e in spans):
+                leftovers.append(fragment.strip())
+        return lines, leftovers
+
+    def line(self, item_id, quantity=None, unit=None):
+        unit = unit if unit in UNITS else None
+        price_unit = self.price_units[item_id]
+        basis_dim, basis_amount = UNITS.get(price_unit, ("pieces", 1.0))
+        # A bare count is that many packs/bunches of a pack- or bunch-priced item, otherwise
+        # pieces: "6 eggs" is half a dozen, "2 bananas" can't be priced when sold per kg
+        if quantity is not None and unit is None:
+            if basis_dim in ("packs", "bunches"):
+                unit = price_unit if quantity == 1 else basis_dim
+            else:
+                unit = "piece" if quantity == 1 else "pcs"
+        base_quantity, priced = None, True
+        if quantity is not None:
+            base_quantity = quantity
+            if unit:
+                dim, amount = UNITS[unit]
+                if dim == basis_dim:
+                    base_quantity = quantity * amount / basis_amount
+                else:
+                    # "100 g cumin" when cumin is sold by the pack: no honest conversion exists
+                    base_quantity, priced = None, False
+        return {
+            "item_id": item_id,
+            "name": self.names[item_id],
+            "category": self.categories[item_id],
+            "quantity": quantity,
+            "unit": unit or price_unit,
+            "price_unit": price_unit,
+            "base_quantity": base_quantity,
+            "priced": priced,
+        }
+
+    # ---- Pricing ----
+    def price(self, lines):
+        """
+        Prices every line in one NumPy pass. Lines without a quantity count as one
+        price unit; lines whose unit can't be converted get no total and add nothing.
+        """
+        if not lines:
+            return lines, 0.0
+        ids = np.fromiter((l["item_id"] for l in lines), dtype=np.intp, count=len(lines))
+        qty = np.fromiter(
+            (0.0 if not l["priced"] else 1.0 if l["base_quantity"] is None else l["base_quantity"] for l in lines),
+            dtype=np.float64, count=len(lines),
+        )
+        totals = self.prices[ids] * qty
+        for line, unit_price, total in zip(lines, self.prices[ids].tolist(), totals.tolist()):
+            line["unit_price"] = unit_price
+            line["line_total"] = total if line["priced"] else None
+        return lines, float(totals.sum())
@@ -0,0 +1,75 @@
+import csv
+import json
+import os
+import tempfile
+from datetime import datetime
+from filelock import FileLock
+
+# ------------------ FILE PATHS ------------------
+CHAT_LOG_DIR = "chat_logs"
+CSV_LOG_FILE = os.path.join("data", "chat_logs.csv")
+CSV_FIELDS = ["timestamp", "user_id", "user_message", "bot_message"]
+LOCK_TIMEOUT = 30
+
+# ------------------ HELPERS ------------------
+def file_lock(path):
+    # Sidecar lock file so threads *and* processes serialize on the same path
+    return FileLock(f"{path}.lock", timeout=LOCK_TIMEOUT)
+
+def write_json_atomic(path, data):
+    folder = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def append_json_record(path, entry):
+    # Read-modify-write of a JSON array, held under the lock and swapped in atomically
+    with file_lock(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            data = []
+        data.append(entry)
+        write_json_atomic(path, data)
+
+# ------------------ CHAT LOGS ------------------
+def save_chat_to_json(user_msg, bot_msg):
+    os.makedirs(CHAT_LOG_DIR, exist_ok=True)
+    filename = os.path.join(CHAT_LOG_DIR, f"{datetime.now().date()}_chatlog.json")
+
+    log_entry = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "user": user_msg,
+        "bot": bot_msg
+    }
+    append_json_record(filename, log_entry)
+
+def save_chat_to_csv(user_msg, bot_msg, user_id="anonymous"):
+    folder = os.path.dirname(CSV_LOG_FILE)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    row = {
+        "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "user_id": user_id,
+        "user_message": user_msg,
+        "bot_message": bot_msg
+    }
+
+    # One buffered write per row under the lock, so concurrent appends never interleave
+    with file_lock(CSV_LOG_FILE):
+        write_header = not os.path.exists(CSV_LOG_FILE) or os.path.getsize(CSV_LOG_FILE) == 0
+        with open(CSV_LOG_FILE, "a", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, lineterminator="\n")
+            if write_header:
+                writer.writeheader()
+            writer.writerow(row)
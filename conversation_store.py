@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+# ------------------ SETTINGS ------------------
+load_dotenv()
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", os.path.join("user_data", "conversations.db"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turns (
+    id      INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    ts      REAL NOT NULL,
+    role    TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_turns_user_ts ON turns (user_id, ts);
+CREATE TABLE IF NOT EXISTS user_context (
+    user_id       TEXT PRIMARY KEY,
+    last_item     TEXT,
+    last_category TEXT,
+    last_intent   TEXT,
+    updated       REAL NOT NULL
+);
+"""
+
+
+class ConversationStore:
+    """
+    Per-user conversation history in SQLite (WAL mode).
+
+    Every thread gets its own connection; WAL lets readers run alongside a
+    writer, and busy_timeout makes concurrent writers (threads or processes)
+    queue instead of failing with "database is locked".
+    """
+
+    def __init__(self, path=CONVERSATION_DB, busy_timeout_ms=10000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    # ---- Writes ----
+    def append(self, user_id, turns, context=None):
+        # turns: [(role, content)] or [(role, content, ts)]; context: dict like context_memory
+        now = time.time()
+        rows = [(user_id, t[2] if len(t) > 2 else now, t[0], t[1]) for t in turns]
+        with self._conn() as conn:
+            conn.executemany("INSERT INTO turns (user_id, ts, role, content) VALUES (?, ?, ?, ?)", rows)
+            if context is not None:
+                conn.execute(
+                    "INSERT INTO user_context (user_id, last_item, last_category, last_intent, updated) "
+                    "VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET last_item=excluded.last_item, "
+                    "last_category=excluded.last_category, last_intent=excluded.last_intent, updated=excluded.updated",
+                    (user_id, context.get("last_item"), context.get("last_category"), context.get("last_intent"), now),
+                )
+
+    def prune(self, max_age_days=None, keep_last=None):
+        deleted = 0
+        with self._conn() as conn:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                deleted += conn.execute("DELETE FROM turns WHERE ts < ?", (cutoff,)).rowcount
+                conn.execute("DELETE FROM user_context WHERE updated < ?", (cutoff,))
+            if keep_last is not None:
+                deleted += conn.execute(
+                    "DELETE FROM turns WHERE id IN ("
+                    " SELECT id FROM (SELECT id, ROW_NUMBER() OVER"
+                    "  (PARTITION BY user_id ORDER BY ts DESC, id DESC) AS rn FROM turns)"
+                    " WHERE rn > ?)",
+                    (keep_last,),
+                ).rowcount
+        return deleted
+
+    # ---- Reads ----
+    def last_turns(self, user_id, n=8):
+        rows = self._conn().execute(
+            "SELECT role, content FROM turns WHERE user_id = ? ORDER BY ts DESC, id DESC LIMIT ?",
+            (user_id, n),
+        ).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def load_context(self, user_id):
+        row = self._conn().execute(
+            "SELECT last_item, last_category, last_intent FROM user_context WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return {}
+        return {"last_item": row[0], "last_category": row[1], "last_intent": row[2]}
+
+    # ---- Migration ----
+    def import_json_transcript(self, user_id, path):
+        # Legacy user_data/<user>.json: [{"timestamp", "user_input", "bot_reply"}, ...]
+        # Turns already in the store are skipped, so re-running an import adds nothing
+        with open(path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        rows = []
+        for entry in entries:
+            ts = datetime.fromisoformat(entry["timestamp"]).timestamp()
+            rows.append((user_id, ts, "user", entry["user_input"]) * 2)
+            rows.append((user_id, ts, "assistant", entry["bot_reply"]) * 2)
+        imported = 0
+        with self._conn() as conn:
+            for row in rows:
+                imported += conn.execute(
+                    "INSERT INTO turns (user_id, ts, role, content) SELECT ?, ?, ?, ? WHERE NOT EXISTS "
+                    "(SELECT 1 FROM turns WHERE user_id = ? AND ts = ? AND role = ? AND content = ?)",
+                    row,
+                ).rowcount
+        return imported
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    # Opened on first use so importing the bot never creates a database
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore()
+        return _store
+
+
+# ------------------ CLI ------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the per-user conversation store")
+    parser.add_argument("--import-dir", help="import legacy <user_id>.json transcripts from this folder")
+    parser.add_argument("--max-age-days", type=float, help="delete turns older than this")
+    parser.add_argument("--keep-last", type=int, help="keep only the newest N turns per user")
+    args = parser.parse_args()
+
+    store = get_store()
+    if args.import_dir:
+        for name in sorted(os.listdir(args.import_dir)):
+            if name.endswith(".json"):
+                count = store.import_json_transcript(name[:-5], os.path.join(args.import_dir, name))
+                print(f"📥 {name}: {count} turns imported")
+    if args.max_age_days is not None or args.keep_last is not None:
+        print(f"🧹 Pruned {store.prune(args.max_age_days, args.keep_last)} turns")
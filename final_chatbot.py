@@ -2,7 +2,13 @@ import json
 import re
 from rapidfuzz import process, fuzz
 from datetime import datetime, date
+from decimal import Decimal, ROUND_HALF_UP
 import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
 from huggingface_hub import InferenceClient
 from dotenv import load_dotenv
 from prompts import (
@@ -12,6 +18,13 @@ from prompts import (
     REFUND_PROMPT,
     MULTIITEM_PROMPT,
 )
+from chat_logger import append_json_record
+from request_profiler import profiler
+from response_cache import ResponseCache
+from conversation_store import get_store
+from speculation import SpeculativeDispatcher
+from admission import AdmissionController, LoadShed, PRIORITY_ACTIVE, PRIORITY_NEW
+from cart import CartCatalog, UNITS
 
 # ------------------ FILE PATHS ------------------
 CHAT_FILE = "chat_data.json"
@@ -19,11 +32,12 @@ ZEPTO_FILE = "zepto_data.json"
 UNANSWERED_FILE = "unanswered.json"
 
 # ------------------ LOAD JSON DATA ------------------
-with open(CHAT_FILE, "r", encoding="utf-8") as f:
-    faq_data = json.load(f)
+def load_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-with open(ZEPTO_FILE, "r", encoding="utf-8") as f:
-    zepto_data = json.load(f)
+faq_data = load_json(CHAT_FILE)
+zepto_data = load_json(ZEPTO_FILE)
 
 if not os.path.exists(UNANSWERED_FILE):
     with open(UNANSWERED_FILE, "w", encoding="utf-8") as f:
@@ -39,13 +53,118 @@ client = InferenceClient(
     token=HUGGINGFACE_API_KEY
 )
 
+# ------------------ RESPONSE CACHE ------------------
+# Canonical query -> (reply, route, context effects) for routes that never touch the LLM
+response_cache = ResponseCache(int(os.getenv("RESPONSE_CACHE_SIZE", "1024")))
+CACHEABLE_ROUTES = {"greeting", "refund", "return", "cancel", "faq", "catalog"}
+# Routes decided by single-word triggers or token_set_ratio, so word order can't change them
+# (messages containing a multi-word trigger never use the order-free key)
+ORDER_FREE_ROUTES = {"greeting", "refund", "return", "cancel", "faq"}
+_recorded_effects = ContextVar("recorded_effects", default=None)
+
+# ------------------ LLM ADMISSION CONTROL ------------------
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("LLM_MAX_CONCURRENCY", "4")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "16")),
+    max_wait_ms=float(os.getenv("LLM_MAX_WAIT_MS", "3000")),
+)
+
+# ------------------ SPECULATIVE LLM ------------------
+# Opt-in: start the LLM call while local matchers run when no deterministic route looks likely
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0").lower() in ("1", "true", "yes")
+speculator = SpeculativeDispatcher(int(os.getenv("SPECULATIVE_MAX_INFLIGHT", "4")))
+_speculation = ContextVar("speculation", default=None)
+
+def reload_data():
+    global faq_data, zepto_data, _vocab, _cart_catalog
+    faq_data = load_json(CHAT_FILE)
+    zepto_data = load_json(ZEPTO_FILE)
+    _vocab = _cart_catalog = None
+    response_cache.clear()
+
 # ------------------ CONTEXT MEMORY ------------------
-context_memory = {
-    "last_item": None,
-    "last_category": None,
-    "last_intent": None,
-    "history": []
-}
+# One memory per chat session; the active session is tracked per thread/task.
+# Sessions are kept least recently used first and dropped once idle or over the cap.
+DEFAULT_SESSION = "default"
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "5000"))
+SESSION_IDLE_SECONDS = float(os.getenv("SESSION_IDLE_SECONDS", "3600"))
+_sessions = OrderedDict()     # session_id -> (memory, last used)
+_sessions_lock = threading.Lock()
+_current_session = ContextVar("current_session", default=DEFAULT_SESSION)
+
+def new_context_memory():
+    return {
+        "last_item": None,
+        "last_category": None,
+        "last_intent": None,
+        "history": []
+    }
+
+# Kept for the CLI loop and older callers: memory of the default session, never evicted
+context_memory = new_context_memory()
+
+def get_context_memory(session_id=None):
+    session_id = session_id or _current_session.get()
+    if session_id == DEFAULT_SESSION:
+        return context_memory
+    now = time.monotonic()
+    with _sessions_lock:
+        entry = _sessions.pop(session_id, None)
+        memory = entry[0] if entry else new_context_memory()
+        _sessions[session_id] = (memory, now)
+        _evict_sessions(now)
+        return memory
+
+def _evict_sessions(now):
+    # Caller holds _sessions_lock; the oldest entry is always the least recently used
+    while _sessions:
+        session_id, (_, last_used) = next(iter(_sessions.items()))
+        if len(_sessions) <= MAX_SESSIONS and now - last_used <= SESSION_IDLE_SECONDS:
+            break
+        del _sessions[session_id]
+        _warmed_sessions.discard(session_id)
+
+def reset_session(session_id):
+    with _sessions_lock:
+        if session_id == DEFAULT_SESSION:
+            context_memory.update(new_context_memory())
+        _sessions.pop(session_id, None)
+        _warmed_sessions.discard(session_id)
+
+# ------------------ PERSISTENT CONVERSATIONS ------------------
+# Sessions tied to a user_id resume from (and append to) the conversation store.
+# user_id must come from an authenticated, server-side identity: anyone who can name
+# an id reads that user's history. The public chat page never passes one.
+_warmed_sessions = set()
+
+# A store failure (e.g. "database is locked" under heavy write load) never costs the user a reply:
+# the session just runs without persistence and warm-up is retried on the next message
+def warm_session(user_id):
+    session_id = _current_session.get()
+    with _sessions_lock:
+        if session_id in _warmed_sessions:
+            return
+    try:
+        store = get_store()
+        context = store.load_context(user_id)
+        turns = store.last_turns(user_id, 8)
+    except (sqlite3.Error, OSError) as e:
+        print("⚠️ Conversation store unavailable, continuing without history:", e)
+        return
+    memory = get_context_memory()
+    with _sessions_lock:
+        if session_id in _warmed_sessions:
+            return   # a concurrent request for this session got there first
+        _warmed_sessions.add(session_id)
+        memory.update({k: v for k, v in context.items() if v})
+        memory["history"][:0] = turns
+        del memory["history"][:-8]
+
+def persist_turn(user_id, user_input, reply):
+    try:
+        get_store().append(user_id, [("user", user_input), ("assistant", reply)], context=get_context_memory())
+    except (sqlite3.Error, OSError) as e:
+        print("⚠️ Could not save conversation turn:", e)
 
 # ------------------ CATEGORY HINTS ------------------
 CATEGORY_HINTS = {
@@ -60,37 +179,75 @@ CATEGORY_HINTS = {
     "Hair Care": ["shampoo", "conditioner", "hair oil"],
 }
 
+FLOWER_WORDS = ["lotus", "plant", "tree", "flower"]
+RESTRICTED_CATEGORIES = {
+    "appliances": ["fridge", "tv", "microwave", "ac", "washing machine"],
+    "footwear": ["shoe", "sandals", "slippers"],
+    "fashion": ["tshirt", "jeans", "dress", "jacket", "clothes"],
+}
+GROCERY_TERMS = ["rice", "dal", "oil", "atta", "flour", "ghee", "butter", "tomato", "onion", "sugar"]
+FAQ_BLOCKED_TERMS = ["type", "types", "brand", "variety", "rice", "dal", "oil", "sugar", "flour", "how", "what", "why", "order"]
+
+# Whole words only, so "ac" doesn't fire on "packets"/"spinach" or "plant" on "eggplant"
+def _word_pattern(words):
+    return re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + r")(?:e?s)?\b")
+
+FLOWER_RE = _word_pattern(FLOWER_WORDS)
+RESTRICTED_PATTERNS = {cat: _word_pattern(keys) for cat, keys in RESTRICTED_CATEGORIES.items()}
+
+# ------------------ ROUTE TRIGGERS ------------------
+GREETING_WORDS = ["hi", "hello", "hey", "hii", "hola"]
+REFUND_TRIGGERS = ["refund", "money back", "reimburse", "not received"]
+RETURN_TRIGGERS = ["return", "replace", "exchange", "wrong item", "damaged", "expired"]
+CANCEL_TRIGGERS = ["cancel", "cancellation", "stop order", "cancel order"]
+# Multi-word phrases checked before FAQ; reordering words could make or break them
+ORDERED_PHRASES = [
+    p for p in REFUND_TRIGGERS + RETURN_TRIGGERS + CANCEL_TRIGGERS + ["one item", "single item", "still waiting", "cash on delivery"]
+    if " " in p
+]
+
 # ------------------ HELPERS ------------------
 def clean_text(text):
-    return re.sub(r"[^\w\s&,]", "", text.lower().strip())
+    # Keeps decimal points inside numbers ("1.5 kg")
+    return re.sub(r"[^\w\s&,.]|(?<!\d)\.|\.(?!\d)", "", text.lower().strip())
+
+def canonical_query(text):
+    # Keyed on exactly the text the routes match on, so two messages share a key only if
+    # every route treats them alike. No plural folding: triggers and fuzzy scores see plurals.
+    key = clean_text(text)
+    if any(p in key for p in ORDERED_PHRASES):
+        return [key]
+    return [key, "~" + " ".join(sorted(key.split()))]
+
+def _record(effect):
+    effects = _recorded_effects.get()
+    if effects is not None:
+        effects.append(effect)
 
 def append_to_history(role, content):
-    context_memory["history"].append({"role": role, "content": content})
-    if len(context_memory["history"]) > 8:
-        context_memory["history"].pop(0)
+    if role == "assistant":
+        _record(("history", content))
+    history = get_context_memory()["history"]
+    history.append({"role": role, "content": content})
+    if len(history) > 8:
+        history.pop(0)
 
 def save_unanswered(question):
-    try:
-        with open(UNANSWERED_FILE, "r", encoding="utf-8") as f:
-            data = json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        data = []
-    data.append({"question": question, "timestamp": datetime.now().isoformat()})
-    with open(UNANSWERED_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    append_json_record(UNANSWERED_FILE, {"question": question, "timestamp": datetime.now().isoformat()})
 
 def update_context(item=None, category=None, intent=None):
+    _record(("context", item, category, intent))
+    memory = get_context_memory()
     if item:
-        context_memory["last_item"] = item
+        memory["last_item"] = item
     if category:
-        context_memory["last_category"] = category
+        memory["last_category"] = category
     if intent:
-        context_memory["last_intent"] = intent
+        memory["last_intent"] = intent
 
 # ------------------ FAQ ------------------
 def check_faq(user_input):
-    blocked_terms = ["type", "types", "brand", "variety", "rice", "dal", "oil", "sugar", "flour", "how", "what", "why", "order"]
-    if any(term in user_input for term in blocked_terms):
+    if any(term in user_input for term in FAQ_BLOCKED_TERMS):
         return None
 
     questions = list(faq_data.keys())
@@ -101,8 +258,11 @@ def check_faq(user_input):
     return faq_data[best_match] if score > 75 else None
 
 # ------------------ QUANTITY & NORMALIZE ------------------
+# Same unit words as the cart tokenizer, longest first so "kgs" wins over "kg"
+QUANTITY_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:(" + "|".join(sorted(UNITS, key=len, reverse=True)) + r")(?![a-z]))?")
+
 def extract_quantity(user_input):
-    match = re.search(r"(\d+(?:\.\d+)?)\s*(kg|kgs|g|grams|packet|packets|piece|pieces|unit|units|dozen|ltr|litre|litres|l)?", user_input)
+    match = QUANTITY_RE.search(user_input)
     if not match:
         return (None, None)
     qty = float(match.group(1))
@@ -117,9 +277,10 @@ def normalize_word(word):
 
 # ------------------ REFUND HANDLER ------------------
 def handle_refund_queries(user_input):
+    # Expects clean_text() output, like every other cached route
     text = user_input.lower()
 
-    if "not received" in text or "still waiting" in text or "haven't" in text:
+    if "not received" in text or "still waiting" in text or "havent" in text:
         return (
             "Sorry about the delay 🙏. Once your returned item is verified, "
             "Zepto usually processes refunds within **7 business days**. "
@@ -154,62 +315,105 @@ def handle_refund_queries(user_input):
 # ------------------ ITEM CHECK ------------------
 def check_items(user_input):
     user_input = clean_text(user_input)
-    responses, matched = [], False
 
     # Reject flowers / plants
-    if any(x in user_input for x in ["lotus", "plant", "tree", "flower"]):
+    if FLOWER_RE.search(user_input):
         return "🌸 Zepto offers basic bouquets only — not full flower or plant categories yet."
 
     # Restricted categories
-    restricted = {
-        "appliances": ["fridge", "tv", "microwave", "ac", "washing machine"],
-        "footwear": ["shoe", "sandals", "slippers"],
-        "fashion": ["tshirt", "jeans", "dress", "jacket", "clothes"],
-    }
-    for cat, keys in restricted.items():
-        if any(k in user_input for k in keys):
-            return f"❌ Zepto doesn’t sell {cat} yet — only groceries and daily essentials."
+    cat = restricted_category(user_input)
+    if cat:
+        return f"❌ Zepto doesn’t sell {cat} yet — only groceries and daily essentials."
 
     # Hint category
-    for category, words in CATEGORY_HINTS.items():
-        if any(k in user_input for k in words):
-            update_context(category=category)
-            break
+    category = category_hint(user_input)
+    if category:
+        update_context(category=category)
 
-    # Multi-item split
-    parts = re.split(r"\s+(?:and|&)\s+|,", user_input)
-    for part in [p.strip() for p in parts if p.strip()]:
+    # Multi-item cart: exact names in one compiled pass, fuzzy matching only for leftover fragments
+    catalog = cart_catalog()
+    lines, leftovers = catalog.parse(user_input)
+    for part in leftovers:
         qty, unit = extract_quantity(part)
-        for category, items in zepto_data.get("items", {}).items():
-            for item, price in items.items():
-                if fuzz.partial_ratio(normalize_word(item), part) > 85:
-                    matched = True
-                    update_context(item, category, "product_query")
-                    if qty:
-                        total = qty * price
-                        responses.append(f"✅ {item.title()} — {qty} {unit or 'unit'} costs ₹{int(total)} (₹{price}/unit).")
-                    else:
-                        responses.append(f"✅ {item.title()} is available under {category.title()} for ₹{price}.")
-        # continue to next part for multi-item support
-
-    if matched:
-        return "\n".join(responses)
-
-    # Grocery AI fallback
-    grocery_terms = ["rice", "dal", "oil", "atta", "flour", "ghee", "butter", "tomato", "onion", "sugar"]
-    if any(t in user_input for t in grocery_terms):
-        return ask_ai_fallback(
-            f"User asked: '{user_input}'. Reply as Zepto grocery assistant with Yes/No + prices."
+        for item_id, item in enumerate(catalog.names):
+            match = fuzz.partial_ratio_alignment(normalize_word(item), part, score_cutoff=85)
+            if match and match.score > 85 and _fits_word(part, match.dest_start, match.dest_end):
+                lines.append(catalog.line(item_id, qty, unit))
+
+    if lines:
+        lines, total = catalog.price(lines)
+        for line in lines:
+            update_context(line["name"], line["category"], "product_query")
+        return format_cart(lines, total)
+
+    return ask_ai_fallback(catalog_fallback_prompt(user_input))
+
+def _fits_word(text, start, end):
+    # The fuzzy match must cover (nearly) whole words: "tomatoe" fits "tomato", "eggplant" doesn't fit "egg"
+    word_start, word_end = start, end
+    while word_start > 0 and text[word_start - 1].isalnum():
+        word_start -= 1
+    while word_end < len(text) and text[word_end].isalnum():
+        word_end += 1
+    return (word_end - word_start) - (end - start) <= 2
+
+def restricted_category(user_input):
+    for cat, pattern in RESTRICTED_PATTERNS.items():
+        if pattern.search(user_input):
+            return cat
+    return None
+
+_cart_catalog = None
+
+def cart_catalog():
+    global _cart_catalog
+    if _cart_catalog is None:
+        _cart_catalog = CartCatalog(
+            zepto_data.get("items", {}), normalize=normalize_word, price_units=zepto_data.get("price_units"),
         )
+    return _cart_catalog
+
+def rupees(amount):
+    # Whole rupees, halves rounded up (format() would round ₹32.5 to even, i.e. ₹32)
+    return Decimal(str(round(amount, 2))).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+
+def format_cart(lines, total):
+    responses = []
+    for line in lines:
+        if line["quantity"] is None:
+            responses.append(f"✅ {line['name'].title()} is available under {line['category'].title()} for ₹{line['unit_price']:g}.")
+        elif not line["priced"]:
+            responses.append(
+                f"✅ {line['name'].title()} is available under {line['category'].title()} for "
+                f"₹{line['unit_price']:g}/{line['price_unit']} — it's sold per {line['price_unit']}, "
+                f"so I can't price {line['quantity']:g} {line['unit']}."
+            )
+        else:
+            responses.append(
+                f"✅ {line['name'].title()} — {line['quantity']:g} {line['unit']} costs ₹{rupees(line['line_total'])} "
+                f"(₹{line['unit_price']:g}/{line['price_unit']})."
+            )
+    if len(lines) > 1 and any(line["line_total"] is not None and line["quantity"] is not None for line in lines):
+        responses.append(f"🧾 Cart total: ₹{rupees(total)}")
+    return "\n".join(responses)
 
-    return ask_ai_fallback(
-        f"User asked: '{user_input}'. Respond politely as Zepto assistant with relevant info and ₹ prices."
-    )
+def category_hint(user_input):
+    for category, words in CATEGORY_HINTS.items():
+        if any(k in user_input for k in words):
+            return category
+    return None
+
+def catalog_fallback_prompt(user_input):
+    # Grocery AI fallback
+    if any(t in user_input for t in GROCERY_TERMS):
+        return f"User asked: '{user_input}'. Reply as Zepto grocery assistant with Yes/No + prices."
+    return f"User asked: '{user_input}'. Respond politely as Zepto assistant with relevant info and ₹ prices."
 
 # ------------------ AI FALLBACK ------------------
-def ask_ai_fallback(user_input):
-    last_item = context_memory.get("last_item")
-    last_category = context_memory.get("last_category")
+def build_ai_messages(user_input, memory=None):
+    memory = memory or get_context_memory()
+    last_item = memory.get("last_item")
+    last_category = memory.get("last_category")
 
     context_prompt = f"""
 Recent Context:
@@ -225,9 +429,13 @@ User query: "{user_input}"
     )
 
     messages = [{"role": "system", "content": base_prompt}]
-    messages.extend(context_memory["history"])
+    messages.extend(memory["history"])
     messages.append({"role": "user", "content": user_input})
+    return messages
 
+def call_llm(messages, priority=PRIORITY_NEW, wait=True):
+    if not admission.acquire(priority, wait):
+        raise LoadShed()
     try:
         response = client.chat.completions.create(
             model="meta-llama/Meta-Llama-3-8B-Instruct",
@@ -235,40 +443,180 @@ User query: "{user_input}"
             max_tokens=350,
             temperature=0.6,
         )
-        content = response.choices[0].message["content"].strip()
-        content = re.sub(r"(\$|USD|usd|dollars?)", "₹", content)
+    finally:
+        admission.release()
+    content = response.choices[0].message["content"].strip()
+    return re.sub(r"(\$|USD|usd|dollars?)", "₹", content)
+
+def session_priority():
+    memory = get_context_memory()
+    # History already holds this message, so anything more means an ongoing conversation
+    return PRIORITY_ACTIVE if memory["last_item"] or len(memory["history"]) > 1 else PRIORITY_NEW
+
+def shed_reply():
+    # Match against what the user typed, not the prompt check_items() wrapped around it
+    memory = get_context_memory()
+    user_turns = [h["content"] for h in memory["history"] if h["role"] == "user"]
+    query = clean_text(user_turns[-1]) if user_turns else ""
+    items = {item: price for entries in zepto_data.get("items", {}).values() for item, price in entries.items()}
+    related = [m[0] for m in process.extract(query, list(items), scorer=fuzz.WRatio, limit=3, score_cutoff=80)]
+    if not related:
+        last_cat = (memory.get("last_category") or "").lower()
+        related = list(zepto_data.get("items", {}).get(last_cat, {}))[:3]
+    if not related:
+        related = [next(iter(entries)) for entries in zepto_data.get("items", {}).values()][:3]
+    picks = ", ".join(f"{item.title()} (₹{items[item]})" for item in related)
+    return (
+        "We're getting a lot of questions right now 🙏 — please try again in a moment. "
+        f"Meanwhile, popular picks: {picks}. Ask me for any item's price and I'll answer instantly!"
+    )
+
+def ask_ai_fallback(user_input):
+    _record(("llm",))
+    messages = build_ai_messages(user_input)
+    try:
+        # Reuse a speculative call only if it was sent with exactly this prompt and context
+        spec = _speculation.get()
+        pending = spec.claim(messages) if spec else None
+        content = None
+        if pending:
+            try:
+                content = pending.result()
+            except LoadShed:
+                spec.skip()   # speculation found no free slot; queue like any other fallback
+            else:
+                spec.finish()
+        if content is None:
+            content = call_llm(messages, session_priority())
         append_to_history("assistant", content)
         return content
+    except LoadShed:
+        return shed_reply()
     except Exception as e:
         print("⚠️ AI fallback error:", e)
         return "I'm having trouble reaching the AI service right now — but I can help with refund or product details."
 
+# ------------------ SPECULATION ------------------
+_vocab = None
+
+def _local_vocab():
+    # Words that send a message down a deterministic route; rebuilt after reload_data()
+    global _vocab
+    if _vocab is None:
+        catalog = set()
+        for items in zepto_data.get("items", {}).values():
+            catalog.update(normalize_word(item) for item in items)
+        faq = [set(clean_text(q).split()) for q in faq_data]
+        _vocab = (catalog, faq)
+    return _vocab
+
+def likely_deterministic(user_input_clean):
+    words = user_input_clean.split()
+    if any(w in words for w in GREETING_WORDS):
+        return True
+    if any(t in user_input_clean for t in REFUND_TRIGGERS + RETURN_TRIGGERS + CANCEL_TRIGGERS):
+        return True
+    if FLOWER_RE.search(user_input_clean) or restricted_category(user_input_clean):
+        return True
+    catalog, faq = _local_vocab()
+    if any(k in user_input_clean for k in catalog):
+        return True
+    # check_faq needs token_set_ratio > 75, i.e. heavy overlap with one question
+    if words and not any(t in user_input_clean for t in FAQ_BLOCKED_TERMS):
+        tokens = set(words)
+        if any(len(tokens & q) / min(len(tokens), len(q)) >= 0.5 for q in faq if q):
+            return True
+    return False
+
+def start_speculation(user_input):
+    user_input_clean = clean_text(user_input)
+    if likely_deterministic(user_input_clean):
+        return None
+    # Build exactly what check_items() would send, including its category hint
+    memory = dict(get_context_memory())
+    memory["history"] = list(memory["history"])
+    memory["last_category"] = category_hint(user_input_clean) or memory["last_category"]
+    messages = build_ai_messages(catalog_fallback_prompt(user_input_clean), memory)
+    return speculator.start(messages, call_llm, messages, PRIORITY_NEW, False)
+
 # ------------------ MAIN RESPONSE ------------------
-def chatbot_response(user_input):
+def chatbot_response(user_input, session_id=None, user_id=None):
+    token = _current_session.set(session_id or user_id or DEFAULT_SESSION)
+    try:
+        if user_id:
+            warm_session(user_id)
+        if not profiler.enabled:
+            reply = _route_message(user_input)[0]
+        else:
+            req, route = profiler.begin(user_input), "error"
+            try:
+                reply, route = _route_message(user_input)
+            finally:
+                profiler.end(req, route)
+        if user_id:
+            persist_turn(user_id, user_input, reply)
+        return reply
+    finally:
+        _current_session.reset(token)
+
+def _route_message(user_input):
     append_to_history("user", user_input)
+
+    # ⚡ Cached deterministic answer: replay its context updates for this session
+    keys = canonical_query(user_input)
+    cached = response_cache.get(*keys)
+    if cached:
+        reply, route, effects = cached
+        for effect in effects:
+            if effect[0] == "history":
+                append_to_history("assistant", effect[1])
+            else:
+                update_context(*effect[1:])
+        return reply, route
+
+    effects = []
+    token = _recorded_effects.set(effects)
+    spec = start_speculation(user_input) if SPECULATIVE_LLM else None
+    spec_token = _speculation.set(spec)
+    try:
+        reply, route = _route_uncached(user_input)
+    finally:
+        _recorded_effects.reset(token)
+        _speculation.reset(spec_token)
+        if spec:
+            spec.discard()   # no-op if the fallback already used it
+
+    if route in CACHEABLE_ROUTES and ("llm",) not in effects:
+        entry = (reply, route, tuple(effects))
+        response_cache.put(keys[0], entry)
+        if len(keys) > 1 and route in ORDER_FREE_ROUTES:
+            response_cache.put(keys[1], entry)
+    return reply, route
+
+def _route_uncached(user_input):
     user_input_clean = clean_text(user_input)
 
     # 👋 Greeting
-    if any(word in user_input_clean.split() for word in ["hi", "hello", "hey", "hii", "hola"]):
+    if any(word in user_input_clean.split() for word in GREETING_WORDS):
         reply = "Hi 👋! Welcome to Zepto — how can I help you today?"
         append_to_history("assistant", reply)
-        return reply
+        return reply, "greeting"
 
     # 💸 Refund Queries
-    if any(w in user_input_clean for w in ["refund", "money back", "reimburse", "not received"]):
+    if any(w in user_input_clean for w in REFUND_TRIGGERS):
         update_context(intent="refund")
-        return handle_refund_queries(user_input)
+        return handle_refund_queries(user_input_clean), "refund"
 
     # 🔁 Return / Replace Queries
-    if any(w in user_input_clean for w in ["return", "replace", "exchange", "wrong item", "damaged", "expired"]):
+    if any(w in user_input_clean for w in RETURN_TRIGGERS):
         update_context(intent="return")
         return (
             "🔁 To return or replace an item, open the **Zepto app → My Orders → Help → Return/Replace.**\n"
             "Attach a photo of the item if damaged/wrong. Once verified, a refund or replacement will be processed within 3–7 business days."
-        )
+        ), "return"
 
     # ❌ Cancel Order Queries
-    if any(w in user_input_clean for w in ["cancel", "cancellation", "stop order", "cancel order"]):
+    if any(w in user_input_clean for w in CANCEL_TRIGGERS):
         update_context(intent="cancel")
 
         if "one item" in user_input_clean or "single item" in user_input_clean:
@@ -276,25 +624,25 @@ def chatbot_response(user_input):
                 "🛒 You can cancel an **individual item** only if it hasn’t been packed yet.\n"
                 "Go to **My Orders → Select Order → tap on the item → Cancel Item.**\n"
                 "If already packed or shipped, cancellation may not be possible."
-            )
+            ), "cancel"
 
         return (
             "❌ You can cancel your order directly from the **Zepto app** before it's dispatched.\n"
             "Go to **My Orders → Select Order → Cancel Order.**\n"
             "If it’s already out for delivery, please refuse to accept it on arrival."
-        )
+        ), "cancel"
 
     # ❓ FAQ
     faq_ans = check_faq(user_input_clean)
     if faq_ans:
         append_to_history("assistant", faq_ans)
-        return faq_ans
+        return faq_ans, "faq"
 
     # 🛍️ Product / Quantity
     item_ans = check_items(user_input_clean)
     if item_ans:
         append_to_history("assistant", item_ans)
-        return item_ans
+        return item_ans, "catalog"
 
     # 🎉 Festival Offers
     today = str(date.today())
@@ -302,28 +650,29 @@ def chatbot_response(user_input):
         if fest in user_input.lower() or details.get("date") == today:
             fest_ans = f"{details.get('wish')} 🎉 {details.get('offer')}"
             append_to_history("assistant", fest_ans)
-            return fest_ans
+            return fest_ans, "festival"
 
     # 🔁 Continuations
     if user_input_clean in ("yes", "ok", "okay", "please", "tell me more", "go on", "continue"):
-        last_item = context_memory.get("last_item")
-        last_cat = context_memory.get("last_category")
+        memory = get_context_memory()
+        last_item = memory.get("last_item")
+        last_cat = memory.get("last_category")
         if last_item:
             reply = f"Sure 😊 continuing about {last_item.title()} — it's available under {last_cat.title() if last_cat else 'Fresh Produce'}. Want me to show how to order or similar items?"
         else:
             reply = "Could you tell me which product you'd like to continue with?"
         append_to_history("assistant", reply)
-        return reply
+        return reply, "continuation"
 
     # 🧠 AI fallback last resort
     ai_answer = ask_ai_fallback(user_input)
     if ai_answer:
-        return ai_answer
+        return ai_answer, "ai_fallback"
 
     save_unanswered(user_input)
     reply = "Zepto offers a wide range of essentials — could you clarify what product you meant?"
     append_to_history("assistant", reply)
-    return reply
+    return reply, "unanswered"
 
 # ------------------ MAIN LOOP ------------------
 if __name__ == "__main__":
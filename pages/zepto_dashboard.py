@@ -1,8 +1,8 @@
 import streamlit as st
 import pandas as pd
 import os
-from collections import Counter
 from datetime import datetime
+from query_sketch import ensure_backfilled, flush_queries, top_queries, available_days
 
 # ------------------ PAGE CONFIG ------------------
 st.set_page_config(page_title="📊 Zepto Chatbot Analytics", layout="wide")
@@ -29,9 +29,23 @@ if os.path.exists(log_file):
 
     # ------------------ FREQUENT QUERIES ------------------
     st.subheader("💬 Most Frequent User Queries")
-    all_words = " ".join(df["user_message"].dropna()).lower().split()
-    common_words = Counter(all_words).most_common(10)
-    st.bar_chart(pd.DataFrame(common_words, columns=["Word", "Count"]).set_index("Word"))
+    # One-time backfill of the heavy-hitters sketch from existing logs (no-op once done)
+    ensure_backfilled()
+    flush_queries()   # include this process's buffered messages
+
+    window = st.selectbox("Window", ["All time"] + available_days())
+    day = None if window == "All time" else window
+    col1, col2 = st.columns(2)
+    with col1:
+        st.caption("Top queries")
+        top = top_queries(10, day=day)
+        if top:
+            st.bar_chart(pd.DataFrame(top, columns=["Query", "Count"]).set_index("Query"))
+    with col2:
+        st.caption("Top terms & phrases")
+        top = top_queries(10, day=day, kind="ngrams")
+        if top:
+            st.bar_chart(pd.DataFrame(top, columns=["Term", "Count"]).set_index("Term"))
 
     # ------------------ USER ACTIVITY ------------------
     st.subheader("📈 Last 20 User Messages")
@@ -0,0 +1,285 @@
+import atexit
+import csv
+import heapq
+import json
+import os
+import re
+import threading
+from datetime import datetime
+import chat_logger
+from chat_logger import file_lock
+
+# ------------------ SETTINGS ------------------
+QUERY_STATS_FILE = os.path.join("data", "query_stats.json")
+SKETCH_CAPACITY = 500       # counters per all-time sketch; counts overestimate by at most total/500
+DAY_SKETCH_CAPACITY = 200
+KEEP_DAYS = 30
+# Chat messages are buffered per process and merged into the stats file in batches
+FLUSH_EVERY = int(os.getenv("QUERY_STATS_FLUSH_EVERY", "50"))
+FLUSH_SECONDS = float(os.getenv("QUERY_STATS_FLUSH_SECONDS", "30"))
+MAX_PENDING = 10000
+
+STOP_WORDS = {
+    "a", "an", "the", "is", "are", "am", "was", "i", "me", "my", "you", "your", "it", "its",
+    "to", "of", "in", "on", "for", "from", "at", "by", "with", "and", "or", "do", "does",
+    "can", "could", "will", "would", "please", "what", "how", "why", "when", "where", "which",
+    "there", "this", "that", "we", "our", "be", "have", "has", "any", "some", "zepto",
+}
+
+
+# ------------------ SPACE-SAVING SKETCH ------------------
+class SpaceSaving:
+    """
+    Space-Saving heavy-hitters sketch (Metwally et al.).
+
+    Keeps at most `capacity` counters. A new key evicts the smallest counter
+    and inherits its count, which is remembered as that key's maximum
+    overestimate (`error`). Memory and top-k cost stay fixed however long
+    the stream gets.
+    """
+
+    def __init__(self, capacity=SKETCH_CAPACITY, counters=None):
+        self.capacity = capacity
+        self.counters = {} if counters is None else counters   # key -> [count, error]
+        self._heap = None                # lazy min-heap of (count, key), built on first eviction
+
+    def add(self, key, n=1):
+        if key in self.counters:
+            self.counters[key][0] += n
+            if self._heap is not None:
+                heapq.heappush(self._heap, (self.counters[key][0], key))
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [n, 0]
+            if self._heap is not None:
+                heapq.heappush(self._heap, (n, key))
+        else:
+            floor = self.counters.pop(self._pop_min())[0]
+            self.counters[key] = [floor + n, floor]
+            heapq.heappush(self._heap, (floor + n, key))
+
+    def _pop_min(self):
+        if self._heap is None or len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, (count, _) in self.counters.items()]
+            heapq.heapify(self._heap)
+        # Skip stale entries left behind by increments and evictions
+        while True:
+            count, key = heapq.heappop(self._heap)
+            if key in self.counters and self.counters[key][0] == count:
+                return key
+
+    def top(self, k=10):
+        ranked = sorted(self.counters.items(), key=lambda kv: kv[1][0], reverse=True)
+        return [(key, count) for key, (count, _) in ranked[:k]]
+
+    def to_dict(self):
+        return {"capacity": self.capacity, "counters": self.counters}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("capacity", SKETCH_CAPACITY), data.get("counters", {}))
+
+
+# ------------------ NORMALIZATION ------------------
+def query_terms(message):
+    tokens = re.findall(r"[a-z0-9']+", message.lower())
+    query = " ".join(tokens)
+    words = [t for t in tokens if t not in STOP_WORDS and len(t) > 1]
+    ngrams = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    return query, ngrams
+
+
+# ------------------ PERSISTENCE ------------------
+def _empty_window(capacity=SKETCH_CAPACITY):
+    return {"queries": SpaceSaving(capacity).to_dict(), "ngrams": SpaceSaving(capacity).to_dict()}
+
+
+def _save(path, stats):
+    # Compact JSON, swapped in atomically; the file is rewritten on every logged message
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        # dumps() takes the C encoder; dump() to a file streams through the pure-Python one
+        f.write(json.dumps(stats, ensure_ascii=False, separators=(",", ":")))
+    os.replace(tmp_path, path)
+
+
+def _new_stats():
+    return {"all_time": _empty_window(), "days": {}}
+
+
+def _load(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return _new_stats()
+
+
+def _logged_messages(csv_path):
+    # (message, datetime or None) for every row of the chat log CSV
+    try:
+        with file_lock(csv_path), open(csv_path, "r", encoding="utf-8", newline="") as f:
+            rows = list(csv.DictReader(f))
+    except FileNotFoundError:
+        return []
+    messages = []
+    for row in rows:
+        try:
+            when = datetime.fromisoformat(row.get("timestamp") or "")
+        except ValueError:
+            when = None   # unknown day: counted all-time only
+        if row.get("user_message"):
+            messages.append((row["user_message"], when))
+    return messages
+
+
+def _sketches(stats, day):
+    # Sketches stay live across a batch so the eviction heap is built once per window
+    if day not in stats["_live"]:
+        window = stats["all_time"] if day is None else stats["days"].setdefault(day, _empty_window(DAY_SKETCH_CAPACITY))
+        stats["_live"][day] = (SpaceSaving.from_dict(window["queries"]), SpaceSaving.from_dict(window["ngrams"]))
+    return stats["_live"][day]
+
+
+def _add(stats, day, query, ngrams):
+    queries, terms = _sketches(stats, day)
+    queries.add(query)
+    for gram in ngrams:
+        terms.add(gram)
+
+
+def _add_messages(stats, messages, default_day=False):
+    for message, when in messages:
+        query, ngrams = query_terms(message)
+        if not query:
+            continue
+        _add(stats, None, query, ngrams)
+        if when is None and default_day:
+            when = datetime.now()
+        if isinstance(when, datetime):
+            _add(stats, str(when.date()), query, ngrams)
+
+
+def record_queries(messages, path=None, csv_path=None):
+    # messages: iterable of (message, datetime or None); None means "now"
+    path = path or QUERY_STATS_FILE
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+
+    with file_lock(path):
+        stats = _load(path)
+        backlog = []
+        if not stats.get("backfilled"):
+            # First write, or a file from before the marker: rebuild from the chat log,
+            # which already holds every message logged so far. Done under the lock so
+            # concurrent writers and dashboard viewers backfill exactly once.
+            stats = _new_stats()
+            stats["backfilled"] = True
+            backlog = _logged_messages(csv_path or chat_logger.CSV_LOG_FILE)
+        stats["_live"] = {}
+        _add_messages(stats, backlog)
+        _add_messages(stats, messages, default_day=True)
+        del stats["_live"]
+
+        for day in sorted(stats["days"])[:-KEEP_DAYS]:
+            del stats["days"][day]
+        _save(path, stats)
+
+
+def ensure_backfilled(path=None, csv_path=None):
+    if not _load(path or QUERY_STATS_FILE).get("backfilled"):
+        record_queries([], path, csv_path)
+
+
+# ------------------ BUFFERED RECORDING ------------------
+class QueryRecorder:
+    """
+    Per-process buffer in front of record_queries().
+
+    Logging a chat message is a list append; a background thread merges the
+    buffer into the stats file every `flush_every` messages or `flush_seconds`,
+    so the locked read-modify-write is paid once per batch, off the request
+    path. A failed flush keeps the batch (up to MAX_PENDING) for the next try.
+    """
+
+    def __init__(self, path=None, flush_every=FLUSH_EVERY, flush_seconds=FLUSH_SECONDS):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._backfilled = False
+
+    def add(self, message, when=None):
+        if not self._backfilled:
+            self._backfill()
+        with self._lock:
+            self._pending.append((message, when or datetime.now()))
+            del self._pending[:-MAX_PENDING]
+            full = len(self._pending) >= self.flush_every
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._flush_loop, name="query-stats", daemon=True)
+                self._thread.start()
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            record_queries(batch, self.path)
+        except Exception as e:
+            print("⚠️ Could not update query stats:", e)
+            with self._lock:
+                self._pending[:0] = batch
+                del self._pending[:-MAX_PENDING]
+            return 0
+        return len(batch)
+
+    def _backfill(self):
+        # Once per process, before this process's first message reaches the chat log CSV;
+        # a backfill at flush time would count the buffered messages twice
+        try:
+            ensure_backfilled(self.path)
+            self._backfilled = True
+        except Exception as e:
+            print("⚠️ Could not backfill query stats:", e)
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+
+_recorder = QueryRecorder()
+atexit.register(_recorder.flush)
+
+
+def record_query(message, when=None):
+    # Never raises: query stats must not get in the way of the chat loggers.
+    # Call before the message is written to the chat log CSV (see QueryRecorder._backfill).
+    try:
+        _recorder.add(message, when)
+    except Exception as e:
+        print("⚠️ Could not record query:", e)
+
+
+def flush_queries():
+    return _recorder.flush()
+
+
+def top_queries(k=10, day=None, kind="queries", path=None):
+    stats = _load(path or QUERY_STATS_FILE)
+    window = stats["all_time"] if day is None else stats["days"].get(day)
+    if not window:
+        return []
+    return SpaceSaving.from_dict(window[kind]).top(k)
+
+
+def available_days(path=None):
+    return sorted(_load(path or QUERY_STATS_FILE)["days"], reverse=True)
@@ -0,0 +1,173 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from dotenv import load_dotenv
+
+# ------------------ SETTINGS ------------------
+load_dotenv()
+# All off by default; e.g. PROFILE_SAMPLE_RATE=0.01 PROFILE_SLOW_MS=1500 in .env
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0") or 0)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0") or 0)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5") or 5)
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "200") or 200)   # newest profile files kept on disk
+
+
+class _Request:
+    __slots__ = ("message", "route", "thread_id", "start", "watch_from", "reason", "stacks", "samples")
+
+    def __init__(self, message, thread_id, start, watch_from, reason):
+        self.message = message
+        self.route = None
+        self.thread_id = thread_id
+        self.start = start
+        self.watch_from = watch_from
+        self.reason = reason
+        self.stacks = Counter()
+        self.samples = 0
+
+
+class RequestProfiler:
+    """
+    Low-overhead stack sampler for chatbot requests.
+
+    One daemon thread wakes every `interval_ms` and records the stack of each
+    in-flight request that is being watched: sampled requests from their
+    first millisecond, every other request only once it runs past `slow_ms`.
+    Captured profiles are saved as JSON with collapsed stacks, ready for
+    flamegraph.pl / speedscope.
+    """
+
+    def __init__(self, sample_rate=0.0, slow_ms=0.0, interval_ms=5.0, folder=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.interval_ms = interval_ms
+        self.folder = folder
+        self.keep = keep
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+
+    @property
+    def enabled(self):
+        return self.sample_rate > 0 or self.slow_ms > 0
+
+    def begin(self, message):
+        now = time.perf_counter()
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            watch_from, reason = now, "sampled"
+        elif self.slow_ms > 0:
+            watch_from, reason = now + self.slow_ms / 1000, "slow"
+        else:
+            return None
+
+        req = _Request(message, threading.get_ident(), now, watch_from, reason)
+        with self._lock:
+            self._active[req.thread_id] = req
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name="request-profiler", daemon=True)
+                self._sampler.start()
+        return req
+
+    def end(self, req, route=None):
+        if req is None:
+            return None
+        duration_ms = (time.perf_counter() - req.start) * 1000
+        with self._lock:
+            self._active.pop(req.thread_id, None)
+        req.route = route
+        if req.reason == "slow" and duration_ms < self.slow_ms:
+            return None
+        return self._save(req, duration_ms)
+
+    # ---- Sampling ----
+    def _sample_loop(self):
+        interval = self.interval_ms / 1000
+        while True:
+            time.sleep(interval)
+            now = time.perf_counter()
+            with self._lock:
+                watched = [r for r in self._active.values() if now >= r.watch_from]
+            if not watched:
+                continue
+            frames = sys._current_frames()
+            for req in watched:
+                frame = frames.get(req.thread_id)
+                if frame is not None:
+                    req.stacks[_collapse(frame)] += 1
+                    req.samples += 1
+
+    def _save(self, req, duration_ms):
+        # Runs in the request's finally block: a failed write must never cost the user a reply
+        started = datetime.now()
+        profile = {
+            "id": f"{started.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}",
+            "timestamp": started.strftime("%Y-%m-%d %H:%M:%S"),
+            "message": req.message,
+            "route": req.route,
+            "reason": req.reason,
+            "duration_ms": round(duration_ms, 2),
+            "interval_ms": self.interval_ms,
+            "samples": req.samples,
+            "stacks": dict(req.stacks),
+        }
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(os.path.join(self.folder, f"{profile['id']}.json"), "w", encoding="utf-8") as f:
+                json.dump(profile, f, indent=2, ensure_ascii=False)
+            self._prune()
+        except OSError as e:
+            print("⚠️ Could not save request profile:", e)
+            return None
+        return profile
+
+    def _prune(self):
+        # Profile ids start with a timestamp, so name order is age order
+        names = _profile_names(self.folder)
+        for name in names[self.keep:]:
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass   # another process pruned it first
+
+
+# ------------------ HELPERS ------------------
+def _collapse(frame):
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _profile_names(folder):
+    # Newest first
+    return sorted((n for n in os.listdir(folder) if n.endswith(".json")), reverse=True)
+
+
+def list_profiles(folder=PROFILE_DIR, limit=20):
+    if not os.path.isdir(folder):
+        return []
+    profiles = []
+    for name in _profile_names(folder)[:limit]:
+        try:
+            with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                profiles.append(json.load(f))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return profiles
+
+
+def to_collapsed(profile):
+    # "frame;frame;frame count" lines — the flamegraph.pl / speedscope input format
+    return "\n".join(f"{stack} {count}" for stack, count in sorted(profile.get("stacks", {}).items()))
+
+
+profiler = RequestProfiler(PROFILE_SAMPLE_RATE, PROFILE_SLOW_MS, PROFILE_INTERVAL_MS)
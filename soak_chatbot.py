@@ -0,0 +1,334 @@
+"""
+Concurrency soak test for the Zepto chatbot.
+
+Drives chatbot_response() and the shared-file loggers (unanswered.json,
+chat_logs/*.json, data/chat_logs.csv) from many threads in many processes
+at once, with a stubbed LLM so no network calls are made. Afterwards it
+checks that no log record was lost or corrupted, that no session saw
+another session's context, and prints sustained throughput.
+
+Before the soak it also checks the response cache: messages that share a
+cache key must get the same reply and context whichever of them was
+answered first.
+
+Run from the repo root:
+    python soak_chatbot.py --processes 4 --threads 8 --rounds 25
+"""
+import argparse
+import csv
+import json
+import multiprocessing as mp
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from collections import defaultdict
+
+# Items whose "price of <item>" query matches exactly one catalog entry
+SOAK_ITEMS = [
+    "tomato", "onion", "potato", "carrot", "apple", "banana", "mango", "grapes",
+    "orange", "milk", "paneer", "butter", "cheese", "chicken", "fish", "coriander",
+]
+UNANSWERED_MARKER = "surprise me"
+# Phrasings that differ only in ways the cache key could wrongly fold together
+CACHE_CHECK_MESSAGES = [
+    "hi there", "hi-there", "Hi, there!", "t-shirt", "t shirt", "tshirt please",
+    "2 dozen eggs", "2 dozens eggs", "1.5 kg onion", "15 kg onion", "onion 1.5kg",
+    "refund not received", "not received refund", "I haven't got my refund", "i havent got my refund",
+    "refund for cod", "refund via upi", "cancel one item", "item one cancel", "cancel my order",
+    "how do I return an item", "return an item how", "price of onions", "price of onion", "onions price",
+    "do you sell eggplant", "packets of chilli powder", "spinach 2 bunches", "hello!!", "HELLO",
+]
+
+
+# ------------------ STUB LLM ------------------
+class _StubMessage:
+    def __init__(self, content):
+        self.message = {"content": content}
+
+
+class _StubResponse:
+    def __init__(self, content):
+        self.choices = [_StubMessage(content)]
+
+
+class StubClient:
+    """Stands in for InferenceClient; an empty reply routes the query to save_unanswered()."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.chat = self
+        self.completions = self
+
+    def create(self, model=None, messages=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        user_msg = messages[-1]["content"] if messages else ""
+        if UNANSWERED_MARKER in user_msg:
+            return _StubResponse("")
+        # Echo the session context the bot put in the prompt so callers can spot cross-talk
+        last_item = re.search(r"- Last item: (.*)", messages[0]["content"])
+        return _StubResponse(f"Stub answer about {last_item.group(1) if last_item else 'None'}.")
+
+
+# ------------------ WORKERS ------------------
+def _session_script(session_id, rounds):
+    item = SOAK_ITEMS[zlib.crc32(session_id.encode()) % len(SOAK_ITEMS)]
+    for i in range(rounds):
+        yield i, f"price of {item}", item
+        yield i, "yes", item
+        yield i, "hi", item
+        yield i, f"{UNANSWERED_MARKER} {session_id} {i}", item
+
+
+def _run_session(fc, chat_logger, session_id, rounds, latencies, errors):
+    sent = set()
+    for i, message, item in _session_script(session_id, rounds):
+        sent.add(message)
+        start = time.perf_counter()
+        try:
+            reply = fc.chatbot_response(message, session_id=session_id)
+        except Exception as e:
+            errors.append(f"{session_id}: chatbot_response raised {e!r}")
+            continue
+        latencies.append(time.perf_counter() - start)
+
+        memory = fc.get_context_memory(session_id)
+        if message == "yes" and item not in reply.lower():
+            errors.append(f"{session_id}: continuation used another session's item: {reply!r}")
+        if memory["last_item"] != item:
+            errors.append(f"{session_id}: last_item is {memory['last_item']!r}, expected {item!r}")
+        foreign = [h["content"] for h in memory["history"] if h["role"] == "user" and h["content"] not in sent]
+        if foreign:
+            errors.append(f"{session_id}: history contains other sessions' messages: {foreign[:3]}")
+
+        tag = f"[{session_id}#{i}] {message}"
+        try:
+            chat_logger.save_chat_to_json(tag, reply)
+            chat_logger.save_chat_to_csv(tag, reply, user_id=session_id)
+        except Exception as e:
+            errors.append(f"{session_id}: logging raised {e!r}")
+
+
+def _process_worker(proc_id, threads, rounds, workdir, llm_latency):
+    import final_chatbot as fc
+    import chat_logger
+
+    fc.client = StubClient(llm_latency)
+    fc.UNANSWERED_FILE = os.path.join(workdir, "unanswered.json")
+    chat_logger.CHAT_LOG_DIR = os.path.join(workdir, "chat_logs")
+    chat_logger.CSV_LOG_FILE = os.path.join(workdir, "data", "chat_logs.csv")
+
+    latencies, errors = [], []
+    workers = [
+        threading.Thread(
+            target=_run_session,
+            args=(fc, chat_logger, f"p{proc_id}-t{t}", rounds, latencies, errors),
+        )
+        for t in range(threads)
+    ]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return latencies, errors
+
+
+# ------------------ CACHE CONSISTENCY ------------------
+def _variants(message):
+    words = message.split()
+    yield message
+    yield message.upper() + "?"
+    yield " ".join(reversed(words))
+    yield "  ".join(words)
+    yield " ".join(w + "s" for w in words)
+    if len(words) > 1:
+        yield "-".join(words[:2]) + " " + " ".join(words[2:])
+
+
+def cache_check_messages(csv_path=os.path.join("data", "chat_logs.csv")):
+    messages = list(CACHE_CHECK_MESSAGES)
+    try:
+        with open(csv_path, "r", encoding="utf-8", newline="") as f:
+            messages.extend(row["user_message"] for row in csv.DictReader(f) if row.get("user_message"))
+    except OSError:
+        pass
+    return sorted({v for m in messages for v in _variants(m)})
+
+
+def _answer(fc, message, session_id):
+    fc.reset_session(session_id)
+    reply = fc.chatbot_response(message, session_id=session_id)
+    memory = fc.get_context_memory(session_id)
+    history = [(h["role"], h["content"]) for h in memory["history"]]
+    return reply, memory["last_item"], memory["last_category"], memory["last_intent"], history
+
+
+def check_cache_consistency(fc, messages):
+    # Reference answers with the cache off, each from a fresh session
+    cache = fc.response_cache
+    maxsize = cache.maxsize
+    cache.maxsize = 0
+    cache.clear()
+    reference = {m: _answer(fc, m, "cache-check") for m in messages}
+    cache.maxsize = maxsize or 1024
+
+    groups = defaultdict(set)
+    for message in messages:
+        for key in fc.canonical_query(message):
+            groups[key].add(message)
+
+    errors, pairs = [], 0
+    for key, group in groups.items():
+        for first in sorted(group):
+            if len(group) < 2:
+                break
+            cache.clear()
+            _answer(fc, first, "cache-warm")
+            for other in sorted(group - {first}):
+                pairs += 1
+                got = _answer(fc, other, "cache-check")
+                if got != reference[other]:
+                    errors.append(
+                        f"cache key {key!r}: {other!r} after {first!r} got {got[0]!r}, "
+                        f"uncached {reference[other][0]!r}"
+                    )
+    cache.clear()
+    cache.maxsize = maxsize
+    return errors, pairs
+
+
+# ------------------ VERIFICATION ------------------
+def _expected_tags(processes, threads, rounds):
+    tags = set()
+    for p in range(processes):
+        for t in range(threads):
+            session_id = f"p{p}-t{t}"
+            for i, message, _ in _session_script(session_id, rounds):
+                tags.add(f"[{session_id}#{i}] {message}")
+    return tags
+
+
+def _check_exact(name, seen, expected, errors):
+    duplicates = len(seen) - len(set(seen))
+    missing = expected - set(seen)
+    unexpected = set(seen) - expected
+    if duplicates:
+        errors.append(f"{name}: {duplicates} duplicated records")
+    if missing:
+        errors.append(f"{name}: {len(missing)} records lost, e.g. {sorted(missing)[:3]}")
+    if unexpected:
+        errors.append(f"{name}: {len(unexpected)} unexpected records, e.g. {sorted(unexpected)[:3]}")
+
+
+def verify_files(workdir, processes, threads, rounds):
+    errors = []
+    expected_tags = _expected_tags(processes, threads, rounds)
+    expected_unanswered = {
+        f"{UNANSWERED_MARKER} p{p}-t{t} {i}"
+        for p in range(processes) for t in range(threads) for i in range(rounds)
+    }
+
+    # unanswered.json
+    try:
+        with open(os.path.join(workdir, "unanswered.json"), "r", encoding="utf-8") as f:
+            unanswered = json.load(f)
+        _check_exact("unanswered.json", [e["question"] for e in unanswered], expected_unanswered, errors)
+    except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+        errors.append(f"unanswered.json is corrupted: {e!r}")
+
+    # chat_logs/*.json (a run across midnight spreads over two files)
+    logged = []
+    log_dir = os.path.join(workdir, "chat_logs")
+    for name in sorted(os.listdir(log_dir)) if os.path.isdir(log_dir) else []:
+        if not name.endswith("_chatlog.json"):
+            continue
+        try:
+            with open(os.path.join(log_dir, name), "r", encoding="utf-8") as f:
+                logged.extend(e["user"] for e in json.load(f))
+        except (OSError, json.JSONDecodeError, KeyError, TypeError) as e:
+            errors.append(f"chat_logs/{name} is corrupted: {e!r}")
+    _check_exact("chat_logs/*.json", logged, expected_tags, errors)
+
+    # data/chat_logs.csv
+    rows = []
+    try:
+        with open(os.path.join(workdir, "data", "chat_logs.csv"), "r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            if header != ["timestamp", "user_id", "user_message", "bot_message"]:
+                errors.append(f"chat_logs.csv has a bad header: {header}")
+            for line_no, row in enumerate(reader, start=2):
+                if len(row) != 4:
+                    errors.append(f"chat_logs.csv row {line_no} has {len(row)} fields")
+                    continue
+                if not row[2].startswith(f"[{row[1]}#"):
+                    errors.append(f"chat_logs.csv row {line_no} mixes users: {row[:3]}")
+                rows.append(row[2])
+        _check_exact("chat_logs.csv", rows, expected_tags, errors)
+    except (OSError, StopIteration, csv.Error) as e:
+        errors.append(f"chat_logs.csv is corrupted: {e!r}")
+
+    return errors, len(expected_tags)
+
+
+# ------------------ MAIN ------------------
+def main():
+    parser = argparse.ArgumentParser(description="Concurrency soak test for the Zepto chatbot")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8, help="sessions per process")
+    parser.add_argument("--rounds", type=int, default=25, help="4 messages per round")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per stub LLM call")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="zepto-soak-")
+
+    import final_chatbot as fc
+    fc.client = StubClient()
+    fc.UNANSWERED_FILE = os.path.join(workdir, "cache-check-unanswered.json")
+    messages = cache_check_messages()
+    cache_errors, pairs = check_cache_consistency(fc, messages)
+    print(f"🔑 Cache check: {len(messages)} messages, {pairs} same-key pairs")
+
+    print(f"🧪 Soak: {args.processes} processes × {args.threads} sessions × {args.rounds * 4} messages → {workdir}")
+
+    start = time.perf_counter()
+    with mp.get_context("spawn").Pool(args.processes) as pool:
+        results = pool.starmap(
+            _process_worker,
+            [(p, args.threads, args.rounds, workdir, args.llm_latency) for p in range(args.processes)],
+        )
+    elapsed = time.perf_counter() - start
+
+    latencies = [lat for lats, _ in results for lat in lats]
+    errors = cache_errors + [err for _, errs in results for err in errs]
+    file_errors, total_messages = verify_files(workdir, args.processes, args.threads, args.rounds)
+    errors.extend(file_errors)
+
+    print(f"Messages:   {total_messages} in {elapsed:.2f}s")
+    print(f"Throughput: {total_messages / elapsed:.1f} msg/s (each with 1 JSON + 1 CSV log write)")
+    if latencies:
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        print(f"Latency:    p50 {statistics.median(latencies) * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms")
+
+    if not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if errors:
+        print(f"❌ {len(errors)} problems found:")
+        for err in errors[:20]:
+            print("  -", err)
+        return 1
+    print("✅ No lost/corrupted records, no context cross-talk, cached replies match uncached ones.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Speculation:
+    """One LLM request started ahead of time for a message that will probably reach the fallback."""
+
+    def __init__(self, dispatcher, key, future, started):
+        self.dispatcher = dispatcher
+        self.key = key
+        self.future = future
+        self.started = started
+        self.finished = None
+        self.claimed = None   # when the fallback asked for it
+        self.settled = False
+
+    def claim(self, key):
+        # Returns the pending future if it was issued for exactly this request, else None.
+        # The caller settles it with finish() or skip() once the result is known.
+        if self.settled or self.claimed is not None:
+            return None
+        if key != self.key:
+            self.discard()
+            return None
+        self.claimed = time.perf_counter()
+        return self.future
+
+    def finish(self):
+        # The speculative reply was actually delivered
+        self._settle("used")
+
+    def skip(self):
+        # The speculative call never got to run (e.g. no free LLM slot)
+        self._settle("skipped")
+
+    def discard(self):
+        self._settle("wasted")
+
+    def _settle(self, outcome):
+        if self.settled:
+            return
+        self.settled = True
+        if outcome == "wasted":
+            self.future.cancel()
+        self.dispatcher._settle(self, outcome)
+
+
+class SpeculativeDispatcher:
+    """
+    Bounded pool for speculative LLM calls, with waste/savings accounting.
+
+    A speculation that cannot get a free slot is skipped rather than queued,
+    so speculative traffic never adds to the fallback's own backlog. Only a
+    speculation whose reply was delivered counts as used.
+    """
+
+    def __init__(self, max_inflight=4):
+        self.max_inflight = max_inflight
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._pool = ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="speculative-llm")
+        self._lock = threading.Lock()
+        self.started = 0
+        self.used = 0
+        self.wasted = 0
+        self.skipped = 0
+        self.saved_ms = 0.0
+        self.wasted_ms = 0.0
+
+    def start(self, key, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return None
+        spec = Speculation(self, key, None, time.perf_counter())
+
+        def run():
+            try:
+                return fn(*args)
+            finally:
+                spec.finished = time.perf_counter()
+                self._slots.release()
+
+        try:
+            spec.future = self._pool.submit(run)
+        except RuntimeError:
+            self._slots.release()
+            return None
+        with self._lock:
+            self.started += 1
+        return spec
+
+    def _settle(self, spec, outcome):
+        now = time.perf_counter()
+        if spec.future.cancelled():
+            self._slots.release()   # never ran, so run() never released its slot
+        with self._lock:
+            if outcome == "skipped":
+                self.skipped += 1
+            elif outcome == "used":
+                self.used += 1
+                # Overlap between the LLM call and local matching is what the user no longer waits for
+                self.saved_ms += (min(spec.claimed or now, spec.finished or now) - spec.started) * 1000
+            else:
+                self.wasted += 1
+                if not spec.future.cancelled():
+                    self.wasted_ms += ((spec.finished or now) - spec.started) * 1000
+
+    def stats(self):
+        with self._lock:
+            settled = self.used + self.wasted
+            return {
+                "started": self.started,
+                "used": self.used,
+                "wasted": self.wasted,
+                "skipped": self.skipped,
+                "waste_rate": round(self.wasted / settled, 4) if settled else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+                "avg_saved_ms": round(self.saved_ms / self.used, 1) if self.used else 0.0,
+                "wasted_llm_ms": round(self.wasted_ms, 1),
+            }
@@ -2,9 +2,11 @@ import streamlit as st
 import time
 import os
 import json
-import pandas as pd
-from datetime import datetime
-from final_chatbot import chatbot_response
+import uuid
+from final_chatbot import chatbot_response, reload_data, reset_session, response_cache, speculator, SPECULATIVE_LLM, admission
+from chat_logger import save_chat_to_json, save_chat_to_csv
+from request_profiler import list_profiles, to_collapsed
+from query_sketch import record_query
 
 # ------------------ PAGE CONFIG ------------------
 st.set_page_config(
@@ -66,48 +68,9 @@ elif st.session_state.page == "chat":
     # Store messages
     if "messages" not in st.session_state:
         st.session_state.messages = []
-
-    # ---- Logging Functions ----
-    def save_chat_to_json(user_msg, bot_msg):
-        folder = "chat_logs"
-        os.makedirs(folder, exist_ok=True)
-        filename = os.path.join(folder, f"{datetime.now().date()}_chatlog.json")
-
-        log_entry = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "user": user_msg,
-            "bot": bot_msg
-        }
-
-        if os.path.exists(filename):
-            with open(filename, "r", encoding="utf-8") as f:
-                try:
-                    logs = json.load(f)
-                except json.JSONDecodeError:
-                    logs = []
-        else:
-            logs = []
-
-        logs.append(log_entry)
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(logs, f, indent=2, ensure_ascii=False)
-
-    def save_chat_to_csv(user_msg, bot_msg):
-        folder = "data"
-        os.makedirs(folder, exist_ok=True)
-        csv_file = os.path.join(folder, "chat_logs.csv")
-
-        df = pd.DataFrame([{
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "user_id": "anonymous",
-            "user_message": user_msg,
-            "bot_message": bot_msg
-        }])
-
-        if os.path.exists(csv_file):
-            df.to_csv(csv_file, mode="a", header=False, index=False)
-        else:
-            df.to_csv(csv_file, mode="w", header=True, index=False)
+    # Each browser session keeps its own bot context (last item, history)
+    if "session_id" not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
 
     # ---- Chat Display ----
     chat_container = st.container()
@@ -127,15 +90,21 @@ elif st.session_state.page == "chat":
         st.session_state.messages.append({"role": "user", "content": user_input})
         with st.spinner("Zepto Bot is typing..."):
             time.sleep(0.5)
-            bot_reply = chatbot_response(user_input)
+            bot_reply = chatbot_response(user_input, session_id=st.session_state.session_id)
 
         st.session_state.messages.append({"role": "bot", "content": bot_reply})
+        # Before the CSV write (a process's first call backfills from that CSV); never raises
+        record_query(user_input)
         save_chat_to_json(user_input, bot_reply)
-        save_chat_to_csv(user_input, bot_reply)
+        save_chat_to_csv(user_input, bot_reply, user_id="anonymous")
         st.rerun()
 
     # ---- Back Button ----
     if st.button("🏠 Back to Home", use_container_width=True):
+        # Leaving the chat ends the session; free its bot context right away
+        reset_session(st.session_state.session_id)
+        st.session_state.messages = []
+        del st.session_state.session_id
         st.session_state.page = "home"
         st.rerun()
 
@@ -157,7 +126,7 @@ elif mode == "Admin Logs":
         if not os.path.exists(folder):
             st.info("No logs found yet.")
         else:
-            files = sorted(os.listdir(folder), reverse=True)
+            files = sorted((f for f in os.listdir(folder) if f.endswith("_chatlog.json")), reverse=True)
             for file in files:
                 st.write(f"📅 **{file}**")
                 with open(os.path.join(folder, file), "r", encoding="utf-8") as f:
@@ -169,6 +138,52 @@ elif mode == "Admin Logs":
                         - 🤖 Bot: {entry['bot']}
                         """)
                 st.markdown("---")
+
+        st.subheader("⚡ Response Cache")
+        if st.button("🔄 Reload catalog & FAQ"):
+            reload_data()
+            st.success("Catalog and FAQ reloaded — cache cleared.")
+        stats = response_cache.stats()
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+        col2.metric("Hits / Misses", f"{stats['hits']} / {stats['misses']}")
+        col3.metric("Entries", f"{stats['size']} / {stats['maxsize']}")
+
+        st.subheader("🚦 LLM Admission Control")
+        load = admission.stats()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("In flight", load["in_flight"])
+        col2.metric("Queue depth", load["queue_depth"], f"max {load['max_queue_depth']}", delta_color="off")
+        col3.metric("Wait p95", f"{load['p95_wait_ms']} ms", f"avg {load['avg_wait_ms']} ms", delta_color="off")
+        col4.metric("Shed / Admitted", f"{load['shed']} / {load['admitted']}")
+        if load["shed_by_reason"]:
+            st.caption("Shed by reason: " + ", ".join(f"{k}: {v}" for k, v in load["shed_by_reason"].items()))
+
+        if SPECULATIVE_LLM:
+            st.subheader("🏎️ Speculative LLM Calls")
+            spec = speculator.stats()
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Used / Started", f"{spec['used']} / {spec['started']}")
+            col2.metric("Wasted", f"{spec['waste_rate']:.0%}", f"{spec['wasted_llm_ms']:.0f} ms LLM time", delta_color="off")
+            col3.metric("Avg latency saved", f"{spec['avg_saved_ms']} ms")
+
+        st.subheader("🔥 Request Profiles")
+        profiles = list_profiles()
+        if not profiles:
+            st.info("No profiles captured. Set PROFILE_SAMPLE_RATE or PROFILE_SLOW_MS to enable.")
+        for profile in profiles:
+            st.write(
+                f"🕒 {profile['timestamp']} — **{profile['duration_ms']} ms** "
+                f"({profile['reason']}, route: {profile['route']}, {profile['samples']} samples)"
+            )
+            st.caption(profile["message"])
+            st.download_button(
+                "⬇️ Collapsed stacks",
+                data=to_collapsed(profile),
+                file_name=f"{profile['id']}.folded",
+                mime="text/plain",
+                key=profile["id"],
+            )
     else:
         if password:
             st.sidebar.error("Incorrect password ❌")